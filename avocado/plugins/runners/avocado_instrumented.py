@@ -5,16 +5,24 @@ import sys
 import tempfile
 import time
 import traceback
+from itertools import starmap
+from multiprocessing.connection import wait
 
 from avocado.core.exceptions import TestInterrupt
 from avocado.core.nrunner.app import BaseRunnerApp
-from avocado.core.nrunner.runner import RUNNER_RUN_CHECK_INTERVAL, BaseRunner
+from avocado.core.nrunner.runner import RUNNER_RUN_STATUS_INTERVAL, BaseRunner
 from avocado.core.test import TestID
 from avocado.core.tree import TreeNodeEnvOnly
 from avocado.core.utils import loader, messages
 from avocado.core.varianter import is_empty_variant
 from avocado.utils.deprecation import log_deprecation
 
+#: Whether this runner was started under "coverage run", in which case
+#: coverage data is collected in the test processes as well
+_COVERAGE_ENABLED = "COVERAGE_RUN" in os.environ
+if _COVERAGE_ENABLED:
+    from coverage import Coverage as _Coverage
+
 
 class AvocadoInstrumentedTestRunner(BaseRunner):
     """
@@ -53,17 +61,29 @@ class AvocadoInstrumentedTestRunner(BaseRunner):
             return None
 
         # rebuild the variant tree
-        variant_tree_nodes = [
-            TreeNodeEnvOnly(path, env) for path, env in runnable.variant["variant"]
-        ]
+        tree_nodes = list(starmap(TreeNodeEnvOnly, runnable.variant["variant"]))
 
-        if not is_empty_variant(variant_tree_nodes):
-            tree_nodes = variant_tree_nodes
+        if not is_empty_variant(tree_nodes):
             paths = runnable.variant["paths"]
             return tree_nodes, paths
 
     @staticmethod
-    def _run_avocado(runnable, queue):
+    def _parse_uri(uri):
+        """Splits an uri into module path, class and method names"""
+        # This assumes that a proper resolution (see resolver module)
+        # was performed, and that a URI contains:
+        # 1) path to python module
+        # 2) class
+        # 3) method
+        #
+        # To be defined: if the resolution uri should be composed like
+        # this, or broken down and stored into other data fields
+        module_path, klass_method = uri.split(":", 1)
+        klass, method = klass_method.split(".", 1)
+        return module_path, klass, method
+
+    @staticmethod
+    def _run_avocado(runnable, test_info, queue):
         def load_and_run_test(test_factory):
             instance = loader.load_test(test_factory)
             early_state = instance.get_state()
@@ -74,25 +94,15 @@ class AvocadoInstrumentedTestRunner(BaseRunner):
             return instance.get_state()
 
         try:
-            # This assumes that a proper resolution (see resolver module)
-            # was performed, and that a URI contains:
-            # 1) path to python module
-            # 2) class
-            # 3) method
-            #
-            # To be defined: if the resolution uri should be composed like
-            # this, or broken down and stored into other data fields
             signal.signal(signal.SIGTERM, AvocadoInstrumentedTestRunner.signal_handler)
-            module_path, klass_method = runnable.uri.split(":", 1)
-
-            klass, method = klass_method.split(".", 1)
+            module_path, klass, method, test_id = test_info
 
             params = AvocadoInstrumentedTestRunner._create_params(runnable)
             result_dir = runnable.output_dir or tempfile.mkdtemp(prefix=".avocado-task")
             test_factory = [
                 klass,
                 {
-                    "name": TestID(1, runnable.uri, runnable.variant),
+                    "name": test_id,
                     "methodName": method,
                     "config": runnable.config,
                     "modulePath": module_path,
@@ -105,10 +115,8 @@ class AvocadoInstrumentedTestRunner(BaseRunner):
             messages.start_logging(runnable.config, queue)
 
             # running the actual test
-            if "COVERAGE_RUN" in os.environ:
-                from coverage import Coverage
-
-                coverage = Coverage(data_suffix=True)
+            if _COVERAGE_ENABLED:
+                coverage = _Coverage(data_suffix=True)
                 with coverage.collect():
                     state = load_and_run_test(test_factory)
                 coverage.save()
@@ -127,28 +135,52 @@ class AvocadoInstrumentedTestRunner(BaseRunner):
                 )
             )
         except Exception as e:
-            queue.put(messages.StderrMessage.get(traceback.format_exc()))
+            formatted_traceback = traceback.format_exc()
+            queue.put(messages.StderrMessage.get(formatted_traceback))
             queue.put(
                 messages.FinishedMessage.get(
                     "error",
                     fail_reason=str(e),
                     fail_class=e.__class__.__name__,
-                    traceback=traceback.format_exc(),
+                    traceback=formatted_traceback,
                 )
             )
 
     @staticmethod
-    def _monitor(queue):
+    def _monitor(process, queue):
+        # the queue reader becomes ready when a message arrives, and the
+        # process sentinel when the test process exits
+        reader = queue._reader  # pylint: disable=W0212
+        # a running message is only due after a whole status interval in
+        # which the consumer has not been handed any other message.  The
+        # mark is moved forward after each yield returns, so a slow
+        # consumer never gets a backlog of running messages
+        next_status = time.monotonic() + RUNNER_RUN_STATUS_INTERVAL
         while True:
-            time.sleep(RUNNER_RUN_CHECK_INTERVAL)
-            if queue.empty():
+            timeout = max(0, next_status - time.monotonic())
+            ready = wait([reader, process.sentinel], timeout)
+            if not ready:
                 yield messages.RunningMessage.get()
-            else:
+                next_status = time.monotonic() + RUNNER_RUN_STATUS_INTERVAL
+                continue
+            if reader not in ready:
+                process.join()
+                yield messages.FinishedMessage.get(
+                    "error",
+                    fail_reason=(
+                        f"Test process exited with code {process.exitcode} "
+                        f"without reporting a result"
+                    ),
+                )
+                break
+            # drain everything that is already available before waiting again
+            while not queue.empty():
                 message = queue.get()
                 if message.get("type") != "early_state":
                     yield message
+                    next_status = time.monotonic() + RUNNER_RUN_STATUS_INTERVAL
                 if message.get("status") == "finished":
-                    break
+                    return
 
     def run(self, runnable):
         # pylint: disable=W0201
@@ -156,25 +188,38 @@ class AvocadoInstrumentedTestRunner(BaseRunner):
         self.runnable = runnable
         yield messages.StartedMessage.get()
         try:
-            queue = multiprocessing.SimpleQueue()
-            process = multiprocessing.Process(
-                target=self._run_avocado, args=(self.runnable, queue)
+            # this runner process has already imported avocado, so forking
+            # it is the cheapest way to get a fresh, isolated test process
+            context = (
+                multiprocessing.get_context("fork")
+                if sys.platform != "win32"
+                else multiprocessing.get_context()
+            )
+            # the uri is parsed here, before forking, so that the test
+            # process can start loading the test right away
+            module_path, klass, method = self._parse_uri(self.runnable.uri)
+            test_id = TestID(1, self.runnable.uri, self.runnable.variant)
+            queue = context.SimpleQueue()
+            process = context.Process(
+                target=self._run_avocado,
+                args=(self.runnable, (module_path, klass, method, test_id), queue),
             )
 
             process.start()
 
-            yield from self._monitor(queue)
+            yield from self._monitor(process, queue)
 
         except TestInterrupt:
             process.terminate()
-            yield from self._monitor(queue)
+            yield from self._monitor(process, queue)
         except Exception as e:
-            yield messages.StderrMessage.get(traceback.format_exc())
+            formatted_traceback = traceback.format_exc()
+            yield messages.StderrMessage.get(formatted_traceback)
             yield messages.FinishedMessage.get(
                 "error",
                 fail_reason=str(e),
                 fail_class=e.__class__.__name__,
-                traceback=traceback.format_exc(),
+                traceback=formatted_traceback,
             )
 
 
@@ -1,8 +1,8 @@
 import asyncio
 import logging
 import sys
-import time
 from multiprocessing import Process, SimpleQueue, set_start_method
+from multiprocessing.connection import wait
 
 from avocado.core.nrunner.app import BaseRunnerApp
 from avocado.core.nrunner.runner import RUNNER_RUN_STATUS_INTERVAL, BaseRunner
@@ -68,6 +68,9 @@ class PodmanImageRunner(BaseRunner):
                     fail_class=ex.__class__.__name__,
                 )
                 return
+            # the queue reader becomes ready when the result arrives, and
+            # the process sentinel when the pull process exits
+            waitables = [queue._reader, process.sentinel]  # pylint: disable=W0212
             while queue.empty():
                 if not process.is_alive():
                     process.join()
@@ -81,8 +84,8 @@ class PodmanImageRunner(BaseRunner):
                         )
                         return
                     break
-                time.sleep(RUNNER_RUN_STATUS_INTERVAL)
-                yield messages.RunningMessage.get()
+                if not wait(waitables, RUNNER_RUN_STATUS_INTERVAL):
+                    yield messages.RunningMessage.get()
 
             output = queue.get()
             process.join()
@@ -1,46 +1,107 @@
 #!/usr/bin/env python3
 
 import argparse
-import copy
-import glob
-import multiprocessing
+import functools
+import mmap
 import os
-import platform
 import re
+import runpy
+import stat
 import sys
+import types
 
 from avocado import Test
 from avocado.core import exit_codes
 from avocado.core.job import Job
 from avocado.core.suite import TestSuite
-from avocado.utils import process
 from selftests.utils import python_module_available
 
-TEST_SIZE = {
-    "static-checks": 3,
-    "job-api-check-archive-file-exists": 1,
-    "job-api-check-category-directory-exists": 1,
-    "job-api-check-directory-exists": 2,
-    "job-api-check-file-content": 9,
-    "job-api-check-file-exists": 11,
-    "job-api-check-output-file": 4,
-    "job-api-check-tmp-directory-exists": 1,
-    "nrunner-interface": 90,
-    "nrunner-requirement": 28,
-    "unit": 1027,
-    "jobs": 11,
-    "functional-parallel": 368,
-    "functional-serial": 7,
-    "optional-plugins": 0,
-    "optional-plugins-golang": 2,
-    "optional-plugins-html": 3,
-    "optional-plugins-robot": 3,
-    "optional-plugins-varianter_cit": 40,
-    "optional-plugins-varianter_yaml_to_mux": 50,
-    "vmimage-variants": 256,
-    "vmimage-tests": 35,
-    "pre-release": 18,
-}
+#: Whether check.py is running on an aarch64 machine (os.uname() is not
+#: available on Windows)
+IS_AARCH64 = hasattr(os, "uname") and os.uname().machine == "aarch64"
+
+#: The expected number of tests in each suite.  This is never changed at
+#: run time: main() works on a copy that accounts for optional plugins
+TEST_SIZE = types.MappingProxyType(
+    {
+        "static-checks": 3,
+        "job-api-check-archive-file-exists": 1,
+        "job-api-check-category-directory-exists": 1,
+        "job-api-check-directory-exists": 2,
+        "job-api-check-file-content": 9,
+        "job-api-check-file-exists": 11,
+        "job-api-check-output-file": 4,
+        "job-api-check-tmp-directory-exists": 1,
+        "nrunner-interface": 90,
+        "nrunner-requirement": 28,
+        "unit": 1027,
+        "jobs": 11,
+        "functional-parallel": 369,
+        "functional-serial": 7,
+        "optional-plugins": 0,
+        "optional-plugins-golang": 2,
+        "optional-plugins-html": 3,
+        "optional-plugins-robot": 3,
+        "optional-plugins-varianter_cit": 40,
+        "optional-plugins-varianter_yaml_to_mux": 50,
+        "vmimage-variants": 256,
+        "vmimage-tests": 35,
+        "pre-release": 18,
+    }
+)
+
+#: The optional plugins distributions, and the TEST_SIZE entry of their
+#: tests, added to the "optional-plugins" suite size when installed
+OPTIONAL_PLUGINS_SIZES = (
+    ("avocado-framework-plugin-golang", "optional-plugins-golang"),
+    ("avocado-framework-plugin-result-html", "optional-plugins-html"),
+    ("avocado-framework-plugin-robot", "optional-plugins-robot"),
+    ("avocado-framework-plugin-varianter-cit", "optional-plugins-varianter_cit"),
+    (
+        "avocado-framework-plugin-varianter-yaml-to-mux",
+        "optional-plugins-varianter_yaml_to_mux",
+    ),
+)
+
+#: The number of nrunner interface tests run for each runner
+NRUNNER_INTERFACE_SIZE = 10
+
+#: The optional plugins distributions, their directory names (as used in
+#: --disable-plugin-checks) and the runner they add to the nrunner
+#: interface checks
+NRUNNER_INTERFACE_OPTIONAL_RUNNERS = (
+    ("avocado-framework-plugin-golang", "golang", "avocado-runner-golang"),
+    ("avocado-framework-plugin-robot", "robot", "avocado-runner-robot"),
+    ("avocado-framework-plugin-ansible", "ansible", "avocado-runner-ansible-module"),
+)
+
+#: The tests that are run by default, and that can be given to --select
+#: and --skip
+ALL_TESTS = frozenset(
+    {
+        "static-checks",
+        "job-api",
+        "nrunner-interface",
+        "nrunner-requirement",
+        "unit",
+        "jobs",
+        "functional",
+        "optional-plugins",
+    }
+)
+
+#: The tests that are only run when given to --select
+SELECT_ONLY_TESTS = frozenset({"vmimage", "pre-release"})
+
+#: The functional selftests directory
+FUNCTIONAL_PATH = os.path.join("selftests", "functional")
+
+#: The functional selftests directories that are run in parallel, in
+#: addition to the Python files at the top of FUNCTIONAL_PATH
+FUNCTIONAL_EXTRA_REFERENCES = (
+    os.path.join(FUNCTIONAL_PATH, "utils"),
+    os.path.join(FUNCTIONAL_PATH, "plugin"),
+)
 
 
 class JobAPIFeaturesTest(Test):
@@ -48,8 +109,7 @@ class JobAPIFeaturesTest(Test):
         """Check if a directory exists"""
         if path is None:
             path = os.path.join(self.latest_workdir, self.params.get("directory"))
-        assert_func = self.get_assert_function()
-        assert_func(os.path.isdir(path))
+        self.assert_function(os.path.isdir(path))
 
     def check_exit_code(self, exit_code):
         """Check if job ended with success."""
@@ -59,16 +119,14 @@ class JobAPIFeaturesTest(Test):
         self.assertEqual(expected_exit_code, exit_code)
 
     def check_file_exists(self, file_path):
-        """Check if a file exists or not depending on the `assert_func`."""
-        assert_func = self.get_assert_function()
-        assert_func(os.path.exists(file_path))
+        """Check if a file exists or not depending on the `assert_function`."""
+        self.assert_function(os.path.exists(file_path))
 
     def check_file_content(self, file_path):
         """Check if `content` exists or not in a file."""
         content = self.params.get("content")
-        assert_func = self.get_assert_function()
         regex = self.params.get("regex", default=False)
-        assert_func(self.file_has_content(file_path, content, regex))
+        self.assert_function(self.file_has_content(file_path, content, regex))
 
     def create_config(self, value=None):
         """Creates the Job config."""
@@ -91,22 +149,28 @@ class JobAPIFeaturesTest(Test):
     @staticmethod
     def file_has_content(file_path, content, regex):
         """Check if a file has `content`."""
-        if os.path.isfile(file_path):
+        # a single stat() answers both "is it a file?" and "is it empty?"
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return False
+        if not stat.S_ISREG(file_stat.st_mode):
+            return False
+        if regex:
+            pattern = re.compile(content)
             with open(file_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            for line in lines:
-                if regex:
-                    if re.match(content, line):
-                        return True
-                else:
-                    if content in line:
-                        return True
-        return False
-
-    def get_assert_function(self):
-        """Return an assert function depending on the assert passed"""
-        assert_option = self.params.get("assert")
-        if assert_option:
+                return any(pattern.match(line) for line in f)
+        # an empty file can not be mapped
+        if not file_stat.st_size:
+            return False
+        with open(file_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped.find(content.encode()) != -1
+
+    @functools.cached_property
+    def assert_function(self):
+        """The assert function depending on the assert passed"""
+        if self.params.get("assert"):
             return self.assertTrue
         return self.assertFalse
 
@@ -225,6 +289,10 @@ class JobAPIFeaturesTest(Test):
         self.check_directory_exists(tmpdir)
 
 
+def comma_separated_list(value):
+    return value.split(",")
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -252,21 +320,22 @@ The list of test availables for --skip and --select are:
     group.add_argument(
         "--skip",
         help="Run all tests and skip listed tests",
-        action="append",
+        type=comma_separated_list,
+        action="extend",
         default=[],
     )
     group.add_argument(
         "--select",
         help="Do not run any test, only these listed after",
-        action="append",
+        type=comma_separated_list,
+        action="extend",
         default=[],
     )
-    # Hidden argument to have the list of tests
-    group.add_argument("--dict-tests", default={}, help=argparse.SUPPRESS)
     parser.add_argument(
         "--disable-plugin-checks",
         help="Disable checks for one or more plugins (by directory name), separated by comma",
-        action="append",
+        type=comma_separated_list,
+        action="extend",
         default=[],
     )
 
@@ -274,44 +343,103 @@ The list of test availables for --skip and --select are:
     return arg
 
 
-def create_suite_job_api(args):  # pylint: disable=W0621
-    suites = []
-
-    def get_ref(method_short_name):
-        return [f"{__file__}:JobAPIFeaturesTest.test_{method_short_name}"]
+def list_dir(path, suffix="", dirs_only=False):
+    """Lists the paths of the non hidden entries of a directory.
+
+    This is equivalent to ``glob.glob(f"{path}/*{suffix}")``, but uses a
+    single :func:`os.scandir` pass.  A missing directory, or a path that
+    is not a directory, results in an empty list.  With ``dirs_only``,
+    only the entries that are directories are listed, which is answered
+    by the same :func:`os.scandir` pass on most filesystems.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return [
+                entry.path
+                for entry in entries
+                if not entry.name.startswith(".")
+                and entry.name.endswith(suffix)
+                and (not dirs_only or entry.is_dir())
+            ]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def dir_entry_names(path):
+    """Returns the set of the names of all the entries of a directory."""
+    with os.scandir(path) as entries:
+        return {entry.name for entry in entries}
+
+
+#: Variants added to the job-api-check-file-exists suite when the HTML
+#: result plugin is available
+JOB_API_HTML_FILE_EXISTS_VARIANTS = [
+    {
+        "namespace": "job.run.result.html.enabled",
+        "value": True,
+        "file": "results.html",
+        "assert": True,
+    },
+    {
+        "namespace": "job.run.result.html.enabled",
+        "value": False,
+        "file": "results.html",
+        "assert": False,
+    },
+]
+
+#: Variants added to the job-api-check-output-file suite when the HTML
+#: result plugin is available
+JOB_API_HTML_OUTPUT_FILE_VARIANTS = [
+    {
+        "namespace": "job.run.result.html.output",
+        "file": "custom.html",
+        "assert": True,
+    },
+]
+
+
+def get_job_api_ref(method_short_name):
+    return [f"{__file__}:JobAPIFeaturesTest.test_{method_short_name}"]
+
+
+def create_suite_job_api_configs(args):  # pylint: disable=W0621
+    configs = []
+    check_html = (
+        python_module_available("avocado-framework-plugin-result-html")
+        and "html" not in args.disable_plugin_checks
+    )
 
     # ========================================================================
     # Test if the archive file was created
     # ========================================================================
     config_check_archive_file_exists = {
-        "resolver.references": get_ref("check_archive_file_exists"),
+        "resolver.references": get_job_api_ref("check_archive_file_exists"),
         "run.dict_variants.variant_id_keys": ["namespace", "value"],
         "run.dict_variants": [
             {"namespace": "run.results.archive", "value": True, "assert": True},
         ],
     }
 
-    suites.append(
-        TestSuite.from_config(
-            config_check_archive_file_exists, "job-api-check-archive-file-exists"
-        )
+    configs.append(
+        ("job-api-check-archive-file-exists", config_check_archive_file_exists)
     )
 
     # ========================================================================
     # Test if the category directory was created
     # ========================================================================
     config_check_category_directory_exists = {
-        "resolver.references": get_ref("check_category_directory_exists"),
+        "resolver.references": get_job_api_ref("check_category_directory_exists"),
         "run.dict_variants.variant_id_keys": ["namespace", "value"],
         "run.dict_variants": [
             {"namespace": "run.job_category", "value": "foo", "assert": True},
         ],
     }
 
-    suites.append(
-        TestSuite.from_config(
-            config_check_category_directory_exists,
+    configs.append(
+        (
             "job-api-check-category-directory-exists",
+            config_check_category_directory_exists,
         )
     )
 
@@ -319,7 +447,7 @@ def create_suite_job_api(args):  # pylint: disable=W0621
     # Test if a directory was created
     # ========================================================================
     config_check_directory_exists = {
-        "resolver.references": get_ref("check_directory_exists"),
+        "resolver.references": get_job_api_ref("check_directory_exists"),
         "run.dict_variants.variant_id_keys": ["namespace", "value"],
         "run.dict_variants": [
             {
@@ -337,17 +465,13 @@ def create_suite_job_api(args):  # pylint: disable=W0621
         ],
     }
 
-    suites.append(
-        TestSuite.from_config(
-            config_check_directory_exists, "job-api-check-directory-exists"
-        )
-    )
+    configs.append(("job-api-check-directory-exists", config_check_directory_exists))
 
     # ========================================================================
     # Test the content of a file
     # ========================================================================
     config_check_file_content = {
-        "resolver.references": get_ref("check_file_content"),
+        "resolver.references": get_job_api_ref("check_file_content"),
         "run.dict_variants.variant_id_keys": ["namespace", "value", "file"],
         "run.dict_variants": [
             # finding the correct 'content' here is trick because any
@@ -431,15 +555,13 @@ def create_suite_job_api(args):  # pylint: disable=W0621
         ],
     }
 
-    suites.append(
-        TestSuite.from_config(config_check_file_content, "job-api-check-file-content")
-    )
+    configs.append(("job-api-check-file-content", config_check_file_content))
 
     # ========================================================================
     # Test if the result file was created
     # ========================================================================
     config_check_file_exists = {
-        "resolver.references": get_ref("check_file_exists"),
+        "resolver.references": get_job_api_ref("check_file_exists"),
         "run.dict_variants.variant_id_keys": ["namespace", "value"],
         "run.dict_variants": [
             {
@@ -496,41 +618,17 @@ def create_suite_job_api(args):  # pylint: disable=W0621
                 "file": "result.xml",
                 "assert": False,
             },
-        ],
+        ]
+        + (JOB_API_HTML_FILE_EXISTS_VARIANTS if check_html else []),
     }
 
-    if (
-        python_module_available("avocado-framework-plugin-result-html")
-        and "html" not in args.disable_plugin_checks
-    ):
-
-        config_check_file_exists["run.dict_variants"].append(
-            {
-                "namespace": "job.run.result.html.enabled",
-                "value": True,
-                "file": "results.html",
-                "assert": True,
-            }
-        )
-
-        config_check_file_exists["run.dict_variants"].append(
-            {
-                "namespace": "job.run.result.html.enabled",
-                "value": False,
-                "file": "results.html",
-                "assert": False,
-            }
-        )
-
-    suites.append(
-        TestSuite.from_config(config_check_file_exists, "job-api-check-file-exists")
-    )
+    configs.append(("job-api-check-file-exists", config_check_file_exists))
 
     # ========================================================================
     # Test if a file was created
     # ========================================================================
     config_check_output_file = {
-        "resolver.references": get_ref("check_output_file"),
+        "resolver.references": get_job_api_ref("check_output_file"),
         "run.dict_variants.variant_id_keys": ["namespace", "file"],
         "run.dict_variants": [
             {
@@ -549,58 +647,53 @@ def create_suite_job_api(args):  # pylint: disable=W0621
                 "file": "custom.xml",
                 "assert": True,
             },
-        ],
+        ]
+        + (JOB_API_HTML_OUTPUT_FILE_VARIANTS if check_html else []),
     }
 
-    if (
-        python_module_available("avocado-framework-plugin-result-html")
-        and "html" not in args.disable_plugin_checks
-    ):
-
-        config_check_output_file["run.dict_variants"].append(
-            {
-                "namespace": "job.run.result.html.output",
-                "file": "custom.html",
-                "assert": True,
-            }
-        )
-
-    suites.append(
-        TestSuite.from_config(config_check_output_file, "job-api-check-output-file")
-    )
+    configs.append(("job-api-check-output-file", config_check_output_file))
 
     # ========================================================================
     # Test if the temporary directory was created
     # ========================================================================
     config_check_tmp_directory_exists = {
-        "resolver.references": get_ref("check_tmp_directory_exists"),
+        "resolver.references": get_job_api_ref("check_tmp_directory_exists"),
         "run.dict_variants.variant_id_keys": ["namespace", "value"],
         "run.dict_variants": [
             {"namespace": "run.keep_tmp", "value": True, "assert": True},
         ],
     }
 
-    suites.append(
-        TestSuite.from_config(
-            config_check_tmp_directory_exists, "job-api-check-tmp-directory-exists"
-        )
+    configs.append(
+        ("job-api-check-tmp-directory-exists", config_check_tmp_directory_exists)
     )
-    return suites
+    return configs
 
 
-def create_suites(args):  # pylint: disable=W0621
-    suites = []
+def optional_runners(args):  # pylint: disable=W0621
+    """Returns the optional plugins runners to be checked."""
+    return [
+        runner
+        for distribution_name, plugin_name, runner in NRUNNER_INTERFACE_OPTIONAL_RUNNERS
+        if python_module_available(distribution_name)
+        and plugin_name not in args.disable_plugin_checks
+    ]
+
+
+def create_suites_configs(args):  # pylint: disable=W0621
+    configs = []
     config_check = {"run.ignore_missing_references": True}
 
-    if args.dict_tests["static-checks"]:
-        config_check_static = copy.copy(config_check)
-        config_check_static["resolver.references"] = glob.glob("selftests/*.sh")
-        suites.append(TestSuite.from_config(config_check_static, "static-checks"))
+    if "static-checks" in args.selected_tests:
+        config_check_static = {
+            **config_check,
+            "resolver.references": list_dir("selftests", ".sh"),
+        }
+        configs.append(("static-checks", config_check_static))
 
     # ========================================================================
     # Run nrunner interface checks for all available runners
     # ========================================================================
-    nrunner_interface_size = 10
     config_nrunner_interface = {
         "resolver.references": ["selftests/functional/nrunner_interface.py"],
         "run.dict_variants.variant_id_keys": ["runner"],
@@ -635,43 +728,11 @@ def create_suites(args):  # pylint: disable=W0621
         ],
     }
 
-    if (
-        python_module_available("avocado-framework-plugin-golang")
-        and "golang" not in args.disable_plugin_checks
-    ):
-        config_nrunner_interface["run.dict_variants"].append(
-            {
-                "runner": "avocado-runner-golang",
-            }
-        )
-        TEST_SIZE["nrunner-interface"] += nrunner_interface_size
-
-    if (
-        python_module_available("avocado-framework-plugin-robot")
-        and "robot" not in args.disable_plugin_checks
-    ):
-        config_nrunner_interface["run.dict_variants"].append(
-            {
-                "runner": "avocado-runner-robot",
-            }
-        )
-        TEST_SIZE["nrunner-interface"] += nrunner_interface_size
-
-    if (
-        python_module_available("avocado-framework-plugin-ansible")
-        and "ansible" not in args.disable_plugin_checks
-    ):
-        config_nrunner_interface["run.dict_variants"].append(
-            {
-                "runner": "avocado-runner-ansible-module",
-            }
-        )
-        TEST_SIZE["nrunner-interface"] += nrunner_interface_size
+    for runner in optional_runners(args):
+        config_nrunner_interface["run.dict_variants"].append({"runner": runner})
 
-    if args.dict_tests["nrunner-interface"]:
-        suites.append(
-            TestSuite.from_config(config_nrunner_interface, "nrunner-interface")
-        )
+    if "nrunner-interface" in args.selected_tests:
+        configs.append(("nrunner-interface", config_nrunner_interface))
 
     # ========================================================================
     # Run functional requirement tests
@@ -687,66 +748,51 @@ def create_suites(args):  # pylint: disable=W0621
         ],
     }
 
-    if args.dict_tests["nrunner-requirement"]:
-        suites.append(
-            TestSuite.from_config(config_nrunner_requirement, "nrunner-requirement")
-        )
+    if "nrunner-requirement" in args.selected_tests:
+        configs.append(("nrunner-requirement", config_nrunner_requirement))
 
     # ========================================================================
     # Run all static checks, unit and functional tests
     # ========================================================================
 
-    if args.dict_tests["unit"]:
-        config_check_unit = copy.copy(config_check)
-        config_check_unit["resolver.references"] = ["selftests/unit/"]
-        suites.append(TestSuite.from_config(config_check_unit, "unit"))
-
-    if args.dict_tests["jobs"]:
-        config_check_jobs = copy.copy(config_check)
-        config_check_jobs["resolver.references"] = ["selftests/jobs/"]
-        suites.append(TestSuite.from_config(config_check_jobs, "jobs"))
-
-    if args.dict_tests["functional"]:
-        functional_path = os.path.join("selftests", "functional")
-        references = glob.glob(os.path.join(functional_path, "*.py"))
-        references.extend(
-            [
-                os.path.join(functional_path, "utils"),
-                os.path.join(functional_path, "plugin"),
-            ]
-        )
-        config_check_functional_parallel = copy.copy(config_check)
-        config_check_functional_parallel["resolver.references"] = references
-        suites.append(
-            TestSuite.from_config(
-                config_check_functional_parallel, "functional-parallel"
-            )
-        )
+    if "unit" in args.selected_tests:
+        config_check_unit = {**config_check, "resolver.references": ["selftests/unit/"]}
+        configs.append(("unit", config_check_unit))
 
-        config_check_functional_serial = copy.copy(config_check)
-        config_check_functional_serial["resolver.references"] = [
-            "selftests/functional/serial/"
-        ]
-        config_check_functional_serial["run.max_parallel_tasks"] = 1
-        suites.append(
-            TestSuite.from_config(config_check_functional_serial, "functional-serial")
-        )
+    if "jobs" in args.selected_tests:
+        config_check_jobs = {**config_check, "resolver.references": ["selftests/jobs/"]}
+        configs.append(("jobs", config_check_jobs))
 
-    if args.dict_tests["optional-plugins"]:
-        config_check_optional = copy.copy(config_check)
-        config_check_optional["resolver.references"] = []
-        for optional_plugin in glob.glob("optional_plugins/*"):
+    if "functional" in args.selected_tests:
+        references = list_dir(FUNCTIONAL_PATH, ".py")
+        references.extend(FUNCTIONAL_EXTRA_REFERENCES)
+        config_check_functional_parallel = {
+            **config_check,
+            "resolver.references": references,
+        }
+        configs.append(("functional-parallel", config_check_functional_parallel))
+
+        config_check_functional_serial = {
+            **config_check,
+            "resolver.references": ["selftests/functional/serial/"],
+            "run.max_parallel_tasks": 1,
+        }
+        configs.append(("functional-serial", config_check_functional_serial))
+
+    if "optional-plugins" in args.selected_tests:
+        config_check_optional = {**config_check, "resolver.references": []}
+        for optional_plugin in list_dir("optional_plugins", dirs_only=True):
             plugin_name = os.path.basename(optional_plugin)
             if plugin_name not in args.disable_plugin_checks:
-                pattern = f"{optional_plugin}/tests/*"
-                config_check_optional["resolver.references"] += glob.glob(pattern)
+                tests_dir = os.path.join(optional_plugin, "tests")
+                config_check_optional["resolver.references"] += list_dir(tests_dir)
 
-        suites.append(TestSuite.from_config(config_check_optional, "optional-plugins"))
+        configs.append(("optional-plugins", config_check_optional))
 
     test_dir = os.path.join("selftests", "vmimage")
 
     # Combined vmimage option - tests first, then variants
-    if args.dict_tests.get("vmimage"):
+    if "vmimage" in args.selected_tests:
         # First suite: vmimage tests
         vmimage_tests_config = {
             "resolver.references": [
@@ -754,7 +800,7 @@ def create_suites(args):  # pylint: disable=W0621
             ],
             "run.max_parallel_tasks": 1,
         }
-        suites.append(TestSuite.from_config(vmimage_tests_config, "vmimage-tests"))
+        configs.append(("vmimage-tests", vmimage_tests_config))
 
         # Second suite: vmimage variants
         vmimage_variants_config = {
@@ -766,70 +812,77 @@ def create_suites(args):  # pylint: disable=W0621
             ],
             "run.max_parallel_tasks": 1,
         }
-        suites.append(
-            TestSuite.from_config(vmimage_variants_config, "vmimage-variants")
-        )
+        configs.append(("vmimage-variants", vmimage_variants_config))
 
-    if args.dict_tests.get("pre-release"):
+    if "pre-release" in args.selected_tests:
         os.environ["AVOCADO_CHECK_LEVEL"] = "3"
         pre_release_config = {
             "resolver.references": [
                 os.path.join("selftests", "unit"),
-                os.path.join("selftests", "functional"),
+                FUNCTIONAL_PATH,
             ],
             "filter.by_tags.tags": ["parallel:1"],
             "run.max_parallel_tasks": 1,
         }
-        suites.append(TestSuite.from_config(pre_release_config, "pre-release"))
+        configs.append(("pre-release", pre_release_config))
 
-    return suites
+    return configs
 
 
-def main(args):  # pylint: disable=W0621
+def build_suites(configs):
+    """Creates the test suites out of (name, config) pairs."""
+    return [TestSuite.from_config(config, name) for name, config in configs]
 
-    args.dict_tests = {
-        "static-checks": False,
-        "job-api": False,
-        "nrunner-interface": False,
-        "nrunner-requirement": False,
-        "unit": False,
-        "jobs": False,
-        "functional": False,
-        "optional-plugins": False,
-    }
-    select_only = {
-        "vmimage": False,
-        "pre-release": False,
-    }
 
-    if python_module_available("avocado-framework-plugin-golang"):
-        TEST_SIZE["optional-plugins"] += TEST_SIZE["optional-plugins-golang"]
-    if python_module_available("avocado-framework-plugin-result-html"):
-        TEST_SIZE["optional-plugins"] += TEST_SIZE["optional-plugins-html"]
-    if python_module_available("avocado-framework-plugin-robot"):
-        TEST_SIZE["optional-plugins"] += TEST_SIZE["optional-plugins-robot"]
-    if python_module_available("avocado-framework-plugin-varianter-cit"):
-        TEST_SIZE["optional-plugins"] += TEST_SIZE["optional-plugins-varianter_cit"]
-    if python_module_available("avocado-framework-plugin-varianter-yaml-to-mux"):
-        TEST_SIZE["optional-plugins"] += TEST_SIZE[
-            "optional-plugins-varianter_yaml_to_mux"
-        ]
+def create_suite_job_api(args):  # pylint: disable=W0621
+    return build_suites(create_suite_job_api_configs(args))
 
-    # Make a list of strings instead of a list with a single string
-    if len(args.disable_plugin_checks) > 0:
-        args.disable_plugin_checks = args.disable_plugin_checks[0].split(",")
-    if len(args.select) > 0:
-        args.select = args.select[0].split(",")
-    if len(args.skip) > 0:
-        args.skip = args.skip[0].split(",")
+
+def create_suites(args):  # pylint: disable=W0621
+    return build_suites(create_suites_configs(args))
+
+
+def check_suites_size(suites_by_name, test_size):
+    """Checks that each suite has the expected number of tests.
+
+    Every suite whose size is not the one in ``test_size`` is reported,
+    and whether all the suites have the expected size is returned.
+    """
+    sizes_match = True
+    for name, suite in suites_by_name.items():
+        expected_size = test_size[name]
+        if suite.size != expected_size:
+            sizes_match = False
+            print(
+                f"suite {name} doesn't have {expected_size} tests"
+                f" it has {suite.size}.\n"
+                "If you made some changes into selftests please update `TEST_SIZE`"
+                " variable in `check.py`. If you haven't done any changes to"
+                " selftests this behavior is an ERROR, and it needs to be fixed."
+            )
+    return sizes_match
+
+
+def main(args):  # pylint: disable=W0621
+
+    args.selected_tests = set()
+
+    test_size = dict(TEST_SIZE)
+    for distribution_name, size_key in OPTIONAL_PLUGINS_SIZES:
+        if python_module_available(distribution_name):
+            test_size["optional-plugins"] += test_size[size_key]
+    test_size["nrunner-interface"] += NRUNNER_INTERFACE_SIZE * len(
+        optional_runners(args)
+    )
 
     # Print features covered in this test
     if args.list_features:
-        suites = create_suites(args)
-        suites += create_suite_job_api(args)
+        # only the configs are needed, there's no need to resolve the suites
+        configs = create_suites_configs(args)
+        configs += create_suite_job_api_configs(args)
         features = []
-        for suite in suites:
-            for variants in suite.config["run.dict_variants"]:
+        for _, config in configs:
+            for variants in config.get("run.dict_variants", []):
                 if variants.get("namespace"):
                     features.append(variants["namespace"])
 
@@ -840,37 +893,40 @@ def main(args):  # pylint: disable=W0621
 
     # Will only run the test you select, --select must be followed by list of tests
     elif args.select:
+        valid_tests = ALL_TESTS | SELECT_ONLY_TESTS
         for elem in args.select:
-            if elem not in args.dict_tests.keys() and elem not in select_only.keys():
+            if elem not in valid_tests:
                 print(elem, "is not in the list of valid tests.")
                 exit(0)
             else:
-                args.dict_tests[elem] = True
+                args.selected_tests.add(elem)
 
     # Will run all the tests except these you skip, --skip must be followed by list of tests
     elif args.skip:
-        # Make all the values True, so later we set to False the tests we don't want to run
-        args.dict_tests = {x: True for x in args.dict_tests}
+        # Select all the tests, so later we remove the tests we don't want to run
+        args.selected_tests = set(ALL_TESTS)
 
         for elem in args.skip:
-            if elem not in args.dict_tests.keys():
+            if elem not in ALL_TESTS:
                 print(elem, "is not in the list of valid tests.")
                 exit(0)
             else:
-                args.dict_tests[elem] = False
+                args.selected_tests.discard(elem)
 
     # If no option was selected, run all tests!
     elif not (args.skip or args.select):
         print("No test were selected to run, running all of them.")
-        args.dict_tests = {x: True for x in args.dict_tests}
+        args.selected_tests = set(ALL_TESTS)
 
     else:
         print("Something went wrong, please report a bug!")
         exit(1)
 
     suites = create_suites(args)
-    if args.dict_tests["job-api"]:
+    if "job-api" in args.selected_tests:
         suites += create_suite_job_api(args)
+    # suite names are unique within a job
+    suites_by_name = {suite.name: suite for suite in suites}
 
     # ========================================================================
     # Job execution
@@ -881,38 +937,49 @@ def main(args):  # pylint: disable=W0621
     }
 
     # Workaround for travis problem on arm64 - https://github.com/avocado-framework/avocado/issues/4768
-    if platform.machine() == "aarch64":
-        max_parallel = int(multiprocessing.cpu_count() / 2)
-        for suite in suites:
-            if suite.name == "functional-parallel":
-                suite.config["run.max_parallel_tasks"] = max_parallel
+    if IS_AARCH64 and "functional-parallel" in suites_by_name:
+        # only the CPUs this process may run on are usable, which can be
+        # far fewer than the ones in the machine on containerized runners
+        try:
+            cpu_count = len(os.sched_getaffinity(0))
+        except AttributeError:
+            import multiprocessing
+
+            cpu_count = multiprocessing.cpu_count()
+        max_parallel = max(1, cpu_count // 2)
+        suites_by_name["functional-parallel"].config[
+            "run.max_parallel_tasks"
+        ] = max_parallel
+
+    # the suites are resolved when created, so a stale TEST_SIZE is
+    # reported before spending any time running them
+    if not check_suites_size(suites_by_name, test_size):
+        return 1
 
     with Job(config, suites) as j:
-        pre_job_test_result_dirs = set(os.listdir(os.path.dirname(j.logdir)))
+        test_results_dir = os.path.dirname(j.logdir)
+        pre_job_test_result_dirs = dir_entry_names(test_results_dir)
         exit_code = j.run()
-        post_job_test_result_dirs = set(os.listdir(os.path.dirname(j.logdir)))
-        if len(pre_job_test_result_dirs) != len(post_job_test_result_dirs):
+        post_job_test_result_dirs = dir_entry_names(test_results_dir)
+        uncleaned_dirs = post_job_test_result_dirs - pre_job_test_result_dirs
+        if uncleaned_dirs:
             if exit_code == 0:
                 exit_code = 1
             print("check.py didn't clean test results.")
             print("uncleaned directories:")
-            print(post_job_test_result_dirs.difference(pre_job_test_result_dirs))
-        for suite in j.test_suites:
-            if suite.size != TEST_SIZE[suite.name]:
-                if exit_code == 0:
-                    exit_code = 1
-                print(
-                    f"suite {suite.name} doesn't have {TEST_SIZE[suite.name]} tests"
-                    f" it has {suite.size}."
-                )
-                print(
-                    "If you made some changes into selftests please update `TEST_SIZE`"
-                    " variable in `check.py`. If you haven't done any changes to"
-                    " selftests this behavior is an ERROR, and it needs to be fixed."
-                )
-
-    # tmp dirs clean up check
-    process.run(f"{sys.executable} selftests/check_tmp_dirs")
+            print(uncleaned_dirs)
+        # the sizes were already checked before running, this is kept as
+        # a safety net in case a suite changes while the job runs
+        if not check_suites_size(suites_by_name, test_size) and exit_code == 0:
+            exit_code = 1
+
+    # tmp dirs clean up check, run in this interpreter instead of a new
+    # one.  The script always finishes by calling sys.exit()
+    try:
+        runpy.run_path(os.path.join("selftests", "check_tmp_dirs"), run_name="__main__")
+    except SystemExit as tmp_dirs_check:
+        if tmp_dirs_check.code and exit_code == 0:
+            exit_code = 1
     return exit_code
 
 
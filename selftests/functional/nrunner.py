@@ -4,11 +4,21 @@ import time
 import unittest
 
 from avocado.core.job import Job
-from avocado.utils import process
+from avocado.utils import process, script
 from selftests.utils import AVOCADO, BASEDIR, TestCaseTmpDir, skipUnlessPathExists
 
 RUNNER = "avocado-runner-noop"
 
+EXIT_WITHOUT_RESULT_TEST = """import os
+
+from avocado import Test
+
+
+class ExitTest(Test):
+    def test(self):
+        os._exit(3)
+"""
+
 
 class NRunnerFeatures(TestCaseTmpDir):
     @skipUnlessPathExists("/bin/false")
@@ -137,6 +147,24 @@ class RunnableRun(unittest.TestCase):
         self.assertEqual(res.exit_status, 0)
 
 
+class InstrumentedRunnableRun(TestCaseTmpDir):
+    def test_exit_without_result(self):
+        test_path = os.path.join(self.tmpdir.name, "exit_test.py")
+        script.make_script(test_path, EXIT_WITHOUT_RESULT_TEST)
+        # the runner used to wait forever for a result in this case
+        res = process.run(
+            "avocado-runner-avocado-instrumented runnable-run "
+            f"-k avocado-instrumented -u {test_path}:ExitTest.test "
+            f"output_dir={self.tmpdir.name}",
+            ignore_status=True,
+            timeout=60,
+        )
+        self.assertIn(b"'status': 'finished'", res.stdout)
+        self.assertIn(b"'result': 'error'", res.stdout)
+        self.assertIn(b"without reporting a result", res.stdout)
+        self.assertEqual(res.exit_status, 0)
+
+
 class ExecTestStdOutErr(unittest.TestCase):
     def test_64kib(self):
         path = os.path.join(
@@ -1,3 +1,4 @@
+import functools
 import logging
 import os
 import sys
@@ -15,10 +16,14 @@ BASEDIR = os.path.abspath(os.path.join(BASEDIR, os.path.pardir))
 AVOCADO = os.environ.get("UNITTEST_AVOCADO_CMD", f"{sys.executable} -m avocado")
 
 
+@functools.lru_cache(maxsize=None)
 def python_module_available(module_name):
     """
     Checks if a given Python module is available
 
+    The result is cached, as installed distributions are not expected
+    to change during a selftests run.
+
     :param module_name: the name of the module
     :type module_name: str
     :returns: if the Python module is available in the system
@@ -257,19 +257,20 @@ class Test(SimpleCommand):
         self.list_features = False  # pylint: disable=W0201
 
     def run(self):
+        # Import here on purpose, otherwise it'll mess with install/develop commands
+        import selftests.check
+
+        # the values are split here, the same way check.py's own
+        # argument parser does it, as main() expects lists of names
+        split = selftests.check.comma_separated_list
         args = argparse.Namespace()
-        args.skip = self.skip if len(self.skip) == 0 else [self.skip]
-        args.select = self.select if len(self.select) == 0 else [self.select]
+        args.skip = split(self.skip) if self.skip else []
+        args.select = split(self.select) if self.select else []
         args.disable_plugin_checks = (
-            self.disable_plugin_checks
-            if len(self.disable_plugin_checks) == 0
-            else [self.disable_plugin_checks]
+            split(self.disable_plugin_checks) if self.disable_plugin_checks else []
         )
         args.list_features = self.list_features
 
-        # Import here on purpose, otherwise it'll mess with install/develop commands
-        import selftests.check
-
         sys.exit(selftests.check.main(args))
 
 